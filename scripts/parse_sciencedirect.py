@@ -9,121 +9,182 @@ Uso:
   python parse_sciencedirect.py /path/to/raw/query-B_ScienceDirect_30.txt --out /path/to/processed/query-B_ScienceDirect_30_parsed.csv
 
 Opzioni:
-  - puoi passare più input; se --out è una directory, salva un CSV per ciascun input
-  - se --out è un file singolo e ci sono più input, concatena tutto in un unico CSV
+  - puoi passare più input; se --out è una directory, salva un file per ciascun input
+  - se --out è un file singolo e ci sono più input, concatena tutto in un unico file
+  - --format feather|parquet evita il roundtrip CSV quando l'output è consumato
+    da make_abc.py (richiede pyarrow)
 
 Dipendenze: pandas (pip install pandas)
 """
 import argparse
+import os
 import re
 import sys
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # pyarrow opzionale: si torna al writer pandas
+    pa = None
+
+
+def _to_csv_buffered(df: pd.DataFrame, path) -> None:
+    # buffer di scrittura a 64 KB: meno syscall rispetto al default di open()
+    with open(path, "w", buffering=1 << 16, encoding="utf-8", newline="") as f:
+        df.to_csv(f, index=False)
+
+
+def write_csv(df: pd.DataFrame, path) -> None:
+    """Scrive un CSV con il writer C++ multithread di PyArrow se disponibile."""
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # colonne a tipi misti non convertibili: si ripiega su pandas
+            _to_csv_buffered(df, path)
+            return
+        pacsv.write_csv(table, str(path), pacsv.WriteOptions(quoting_style="needed"))
+    else:
+        _to_csv_buffered(df, path)
+
 
 DOI_PAT = re.compile(r"(10\.\d{4,9}/\S+)", re.IGNORECASE)
 URL_PAT = re.compile(r"(https?://\S+)")
 YEAR_PAT = re.compile(r"\b(20\d{2}|19\d{2})\b")
 
 
-def _norm_doi(s: str) -> str:
-    if not isinstance(s, str):
-        return ""
-    s = s.strip()
-    s = s.replace("https://doi.org/", "").replace("http://doi.org/", "")
-    s = s.strip().strip(".").lower()
-    m = DOI_PAT.search(s)
-    return m.group(1).rstrip(".,;)") if m else ""
-
-
 def parse_sciencedirect_txt(text: str) -> pd.DataFrame:
-    lines = [ln.strip() for ln in text.splitlines()]
-    records = []
-    for i, ln in enumerate(lines):
-        doi_match = DOI_PAT.search(ln)
-        if not doi_match:
-            continue
-        doi = doi_match.group(1).rstrip(".,;)")
+    lines = text.splitlines()
+    # offset di inizio di ogni riga: mappa la posizione di un match al suo indice riga
+    line_starts = [0]
+    pos = 0
+    for ln in text.splitlines(keepends=True):
+        pos += len(ln)
+        line_starts.append(pos)
+    # accumulo per colonna (SoA): niente dict per record né transpose in pd.DataFrame
+    titles, years, dois, urls = [], [], [], []
+    # una sola passata C sull'intero buffer invece di search() riga per riga
+    for m in DOI_PAT.finditer(text):
+        i = bisect_right(line_starts, m.start()) - 1
+        doi = m.group(1).rstrip(".,;)")
         # title: prendi una delle ultime 3 righe non vuote, non-URL, non "doi:"
         title = None
         for j in range(i - 1, max(-1, i - 4), -1):
-            if j >= 0 and lines[j] and not lines[j].lower().startswith(("http://", "https://", "doi:")):
-                title = lines[j]
-                break
+            if j >= 0:
+                cand = lines[j].strip()
+                if cand and not cand.lower().startswith(("http://", "https://", "doi:")):
+                    title = cand
+                    break
         # year: cerca nell'intorno
         window = " ".join(lines[max(0, i - 5): i + 6])
         ym = YEAR_PAT.search(window)
         year = ym.group(1) if ym else None
         # url: se presente nella stessa riga (o precedente)
-        url_m = URL_PAT.search(ln) or (URL_PAT.search(lines[i - 1]) if i > 0 else None)
+        url_m = URL_PAT.search(lines[i]) or (URL_PAT.search(lines[i - 1]) if i > 0 else None)
         url = url_m.group(1).rstrip(".,;)") if url_m else None
 
-        records.append({
-            "source": "ScienceDirect",
-            "title": title,
-            "authors": None,  # di solito non presente nel TXT minimale
-            "year": year,
-            "doi": doi,
-            "url": url
-        })
-
-    df = pd.DataFrame(records)
+        titles.append(title)
+        years.append(year)
+        dois.append(doi)
+        urls.append(url)
+
+    df = pd.DataFrame({
+        "source": "ScienceDirect",
+        "title": titles,
+        "authors": None,  # di solito non presente nel TXT minimale
+        "year": years,
+        "doi": dois,
+        "url": urls
+    })
     if not df.empty:
-        # de-dup per DOI normalizzato
-        df["doi_norm"] = df["doi"].map(_norm_doi)
-        df = df.drop_duplicates(subset=["doi_norm"]).drop(columns=["doi_norm"])
-        df = df.reset_index(drop=True)
+        # de-dup: i DOI escono già puliti da DOI_PAT, basta lowercase vettoriale
+        keys = df["doi"].str.lower()
+        df = df.loc[~keys.duplicated()].reset_index(drop=True)
     return df
 
 
 def read_text_file(path: Path) -> str:
+    # una sola lettura dal disco; i tentativi di decodifica lavorano sul buffer
+    data = path.read_bytes()
     for enc in ("utf-8", "utf-8-sig", "latin-1"):
         try:
-            return path.read_text(encoding=enc, errors="ignore")
+            return data.decode(enc, errors="ignore")
         except Exception:
             continue
     raise RuntimeError(f"Cannot read {path} with common encodings")
 
 
+def write_output(df: pd.DataFrame, path, fmt: str = "csv") -> None:
+    """Scrive il frame nel formato richiesto: csv (default), feather o parquet."""
+    if fmt == "csv":
+        write_csv(df, path)
+    elif pa is None:
+        raise RuntimeError(f"Il formato {fmt} richiede pyarrow (pip install pyarrow)")
+    elif fmt == "feather":
+        df.reset_index(drop=True).to_feather(path)
+    else:  # parquet
+        df.to_parquet(path, index=False)
+
+
+def _parse_one(p: Path) -> pd.DataFrame:
+    return parse_sciencedirect_txt(read_text_file(p))
+
+
+def _process_one(p: Path, out_dir: Path, fmt: str):
+    # top-level (quindi picklabile) per ProcessPoolExecutor
+    df = _parse_one(p)
+    dst = out_dir / f"{p.stem}_parsed.{fmt}"
+    write_output(df, dst, fmt)
+    return dst, len(df)
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("inputs", nargs="+", help="File TXT ScienceDirect da parsare")
-    ap.add_argument("--out", required=True, help="CSV di output o directory")
+    ap.add_argument("--out", required=True, help="File di output o directory")
+    ap.add_argument("--format", choices=("csv", "feather", "parquet"), default="csv",
+                    help="Formato di output; feather/parquet evitano il re-parse CSV a valle")
     args = ap.parse_args()
 
     out_path = Path(args.out)
     inputs = [Path(p) for p in args.inputs]
     frames = []
 
-    if len(inputs) == 1 and out_path.suffix.lower() in (".csv", ".tsv"):
+    if len(inputs) == 1 and out_path.suffix.lower() in (".csv", ".tsv", ".feather", ".parquet"):
         text = read_text_file(inputs[0])
         df = parse_sciencedirect_txt(text)
-        df.to_csv(out_path, index=False)
+        write_output(df, out_path, args.format)
         print(f"[OK] Saved {len(df)} rows -> {out_path}")
         return
 
-    # Più input: se out è dir, salva un file per input; altrimenti concatena
+    # Più input: se out è dir, salva un file per input; altrimenti concatena.
+    # Il parsing è CPU-bound e i file indipendenti: un processo per input.
     if len(inputs) > 1 and (out_path.exists() and out_path.is_dir() or out_path.suffix == ""):
         out_path.mkdir(parents=True, exist_ok=True)
-        for p in inputs:
-            text = read_text_file(p)
-            df = parse_sciencedirect_txt(text)
-            dst = out_path / (p.stem + "_parsed.csv")
-            df.to_csv(dst, index=False)
-            print(f"[OK] {p.name}: {len(df)} rows -> {dst}")
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+            for p, (dst, n) in zip(inputs, ex.map(_process_one, inputs, repeat(out_path), repeat(args.format))):
+                print(f"[OK] {p.name}: {n} rows -> {dst}")
         return
 
     # Concatena in unico CSV
-    for p in inputs:
-        text = read_text_file(p)
-        df = parse_sciencedirect_txt(text)
+    if len(inputs) > 1:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+            parsed = list(ex.map(_parse_one, inputs))
+    else:
+        parsed = [_parse_one(p) for p in inputs]
+    for p, df in zip(inputs, parsed):
         df["__src_file__"] = p.name
         frames.append(df)
     out_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
         columns=["source", "title", "authors", "year", "doi", "url"]
     )
-    out_df.to_csv(out_path, index=False)
+    write_output(out_df, out_path, args.format)
     print(f"[OK] Saved {len(out_df)} rows (merged) -> {out_path}")
 
 